@@ -1,154 +1,198 @@
 
-import io
 import os
 import json
 import zipfile
 import unicodedata
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Tuple, Dict
 
+import numpy as np
 import streamlit as st
 import matplotlib.pyplot as plt
 
 try:
     import yaml
+    YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
     HAS_YAML = True
 except Exception:
     HAS_YAML = False
 
+try:
+    import orjson
+    HAS_ORJSON = True
+except Exception:
+    HAS_ORJSON = False
+
+def yaml_loads(b: bytes):
+    try:
+        return yaml.load(b, Loader=YamlLoader)
+    except yaml.reader.ReaderError:
+        pass  # e.g. invalid UTF-8; retry with the lenient decode below
+    return yaml.load(b.decode("utf-8", errors="ignore"), Loader=YamlLoader)
+
+def json_loads(b: bytes):
+    if HAS_ORJSON:
+        try:
+            return orjson.loads(b)
+        except orjson.JSONDecodeError:
+            pass  # e.g. invalid UTF-8; retry with the lenient stdlib decode below
+    return json.loads(b.decode("utf-8", errors="ignore"))
+
 def nfkc(s: str) -> str:
-    t = unicodedata.normalize("NFKC", s or "")
-    return " ".join(t.split())
+    if not s:
+        return ""
+    if not s.isascii() and not unicodedata.is_normalized("NFKC", s):
+        s = unicodedata.normalize("NFKC", s)
+    return " ".join(s.split())
 
-def norm_speaker(s: str) -> str:
-    s = (s or "").strip().lower()
-    if s == "agent":
-        return "agent"
-    if s in ("customer", "borrower"):
-        return "customer"
-    return "unknown"
+AGENT, CUSTOMER, UNKNOWN = 0, 1, 2
+SPEAKER_MAP = {"agent": AGENT, "customer": CUSTOMER, "borrower": CUSTOMER}
 
-Interval = Tuple[int, int]
+def norm_speaker(s: str) -> int:
+    return SPEAKER_MAP.get((s or "").strip().lower(), UNKNOWN)
 
-def merge_intervals(iv: List[Interval]) -> List[Interval]:
-    if not iv:
-        return []
-    iv = sorted(iv, key=lambda x: (x[0], x[1]))
-    out = [iv[0]]
-    for s, e in iv[1:]:
-        ps, pe = out[-1]
-        if s <= pe:
-            out[-1] = (ps, max(pe, e))
-        else:
-            out.append((s, e))
-    return out
+Intervals = np.ndarray  # (N, 2) int64 rows of [start, end)
 
-def union_length(iv: List[Interval]) -> int:
-    merged = merge_intervals(iv)
-    return sum(e - s for s, e in merged)
+def merge_intervals_np(arr: Intervals) -> Intervals:
+    arr = np.asarray(arr, dtype=np.int64).reshape(-1, 2)
+    if len(arr) == 0:
+        return arr
+    order = np.argsort(arr[:, 0], kind="stable")
+    a = arr[order]
+    cummax = np.maximum.accumulate(a[:, 1])
+    new_group = np.empty(len(a), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = a[1:, 0] > cummax[:-1]
+    starts = a[:, 0][new_group]
+    ends = np.maximum.reduceat(a[:, 1], np.flatnonzero(new_group))
+    return np.stack([starts, ends], axis=1)
 
-def intersect_two_sets(a: List[Interval], b: List[Interval]) -> List[Interval]:
-    a = merge_intervals(a)
-    b = merge_intervals(b)
-    i = j = 0
-    out = []
-    while i < len(a) and j < len(b):
-        s1, e1 = a[i]; s2, e2 = b[j]
-        s = max(s1, s2); e = min(e1, e2)
-        if s < e:
-            out.append((s, e))
-        if e1 <= e2:
-            i += 1
-        else:
-            j += 1
-    return out
+def sweep_metrics(times: np.ndarray, deltas: np.ndarray, speaker: np.ndarray) -> Tuple[int, int, int]:
+    order = np.argsort(times, kind="stable")
+    t = times[order]; d = deltas[order]; sp = speaker[order]
+    agent_active = np.cumsum(np.where(sp == 0, d, 0))[:-1] > 0
+    cust_active = np.cumsum(np.where(sp == 1, d, 0))[:-1] > 0
+    dt = np.diff(t)
+    dur = int(t[-1] - t[0])
+    any_len = int(dt[agent_active | cust_active].sum())
+    over_len = int(dt[agent_active & cust_active].sum())
+    return dur, any_len, over_len
+
+# Below this many turns the NumPy sweep's setup costs more than a plain loop.
+VECTOR_SWEEP_MIN_TURNS = 50
+
+def sweep_turns_py(stime: List[int], etime: List[int], speaker: List[int]) -> Tuple[int, int, int]:
+    n = len(stime)
+    events = sorted(zip(stime + etime, [1] * n + [-1] * n, speaker + speaker))
+    start = t_prev = events[0][0]
+    active = [0, 0, 0]
+    any_len = over_len = 0
+    for t, d, sp in events:
+        dt = t - t_prev
+        if active[AGENT] > 0 or active[CUSTOMER] > 0:
+            any_len += dt
+            if active[AGENT] > 0 and active[CUSTOMER] > 0:
+                over_len += dt
+        active[sp] += d
+        t_prev = t
+    return t_prev - start, any_len, over_len
+
+try:
+    from q3_kernels import merge_intervals_np, sweep_metrics
+    HAS_NUMBA = True
+except Exception:
+    HAS_NUMBA = False
 
-def load_call_from_bytes(file_name: str, file_bytes: bytes) -> Dict:
+@st.cache_data(show_spinner=False, max_entries=1024)
+def load_call_from_bytes(file_name: str, file_bytes: bytes, need_text: bool = False) -> Dict:
     call_id, ext = os.path.splitext(os.path.basename(file_name))
     ext = ext.lower()
     if ext == ".json":
-        data = json.loads(file_bytes.decode("utf-8", errors="ignore"))
+        data = json_loads(file_bytes)
     elif ext in (".yaml", ".yml"):
         if not HAS_YAML:
             raise RuntimeError("PyYAML is required to parse YAML files. Please add pyyaml to requirements.")
-        data = yaml.safe_load(file_bytes.decode("utf-8", errors="ignore"))
+        data = yaml_loads(file_bytes)
     else:
         raise ValueError(f"Unsupported file type: {ext}")
-    turns_raw = data["turns"] if isinstance(data, dict) and "turns" in data else data
-    turns = []
-    for i, t in enumerate(turns_raw or []):
-        sp = norm_speaker(t.get("speaker", ""))
-        stime = t.get("stime", 0)
-        etime = t.get("etime", 0)
-        try:
-            stime = int(stime)
-        except Exception:
-            stime = 0
-        try:
-            etime = int(etime)
-        except Exception:
-            etime = stime
-        if etime < stime:
-            etime = stime
-        txt = t.get("text", "")
-        turns.append({
-            "idx": i,
-            "speaker": sp,
-            "stime": stime,
-            "etime": etime,
-            "text_raw": txt,
-            "text_norm": nfkc(txt),
-        })
-    return {"call_id": call_id, "turns": turns}
+    turns_raw = (data["turns"] if isinstance(data, dict) and "turns" in data else data) or []
+    if not isinstance(turns_raw, list) or not all(isinstance(t, dict) for t in turns_raw):
+        raise ValueError("Call file must be a list of utterances or an object with a 'turns' list.")
+    return build_call(call_id, turns_raw, need_text)
 
-def load_call_from_prompt(call_id: str, prompt_text: str) -> Dict:
-    data = json.loads(prompt_text)
+def load_call_from_prompt(call_id: str, prompt_text: str, need_text: bool = False) -> Dict:
+    data = json_loads(prompt_text.encode("utf-8"))
     turns_raw = data["turns"] if isinstance(data, dict) and "turns" in data else data
     if not isinstance(turns_raw, list):
         raise ValueError("JSON prompt must be a list of utterances or an object with a 'turns' list.")
-    turns = []
+    return build_call(call_id or "PROMPT_1", turns_raw, need_text)
+
+def to_int(x, default: int) -> int:
+    if type(x) is int:
+        return x
+    try:
+        return int(x)
+    except Exception:
+        return default
+
+def build_call(call_id: str, turns_raw: List[Dict], need_text: bool = False) -> Dict:
+    speakers, stimes, etimes = [], [], []
+    idxs, texts_raw, texts_norm = [], [], []
     for i, t in enumerate(turns_raw):
         if not isinstance(t, dict):
             continue
-        sp = norm_speaker(t.get("speaker", ""))
-        stime = t.get("stime", 0)
-        etime = t.get("etime", 0)
-        try:
-            stime = int(stime)
-        except Exception:
-            stime = 0
-        try:
-            etime = int(etime)
-        except Exception:
-            etime = stime
-        if etime < stime:
-            etime = stime
-        txt = t.get("text", "")
-        turns.append({
-            "idx": i,
-            "speaker": sp,
-            "stime": stime,
-            "etime": etime,
-            "text_raw": txt,
-            "text_norm": nfkc(txt),
-        })
-    return {"call_id": call_id or "PROMPT_1", "turns": turns}
+        stime = to_int(t.get("stime", 0), 0)
+        etime = to_int(t.get("etime", 0), stime)
+        etime = stime if etime < stime else etime
+        speakers.append(norm_speaker(t.get("speaker", "")))
+        stimes.append(stime)
+        etimes.append(etime)
+        if need_text:
+            txt = t.get("text", "")
+            idxs.append(i)
+            texts_raw.append(txt)
+            texts_norm.append(nfkc(txt))
+    try:
+        call = {
+            "call_id": call_id,
+            "stime": np.array(stimes, dtype=np.int64),
+            "etime": np.array(etimes, dtype=np.int64),
+            "speaker": np.array(speakers, dtype=np.int8),
+        }
+    except OverflowError:
+        raise ValueError("Turn times must fit in a 64-bit integer.")
+    if need_text:
+        call.update(idx=np.array(idxs, dtype=np.int64), text_raw=texts_raw, text_norm=texts_norm)
+    return call
+
+def intervals_from_turns(call: Dict, who: int) -> Intervals:
+    mask = (call["speaker"] == who) & (call["etime"] > call["stime"])
+    return np.stack([call["stime"][mask], call["etime"][mask]], axis=1)
 
-def intervals_from_turns(turns: List[Dict], who: str) -> List[Interval]:
-    return [(t["stime"], t["etime"]) for t in turns if t["speaker"] == who and t["etime"] > t["stime"]]
+def events_from_turns(stime: np.ndarray, etime: np.ndarray, speaker: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    n = len(stime)
+    times = np.concatenate((stime, etime))
+    deltas = np.concatenate((np.ones(n, dtype=np.int64), np.full(n, -1, dtype=np.int64)))
+    return times, deltas, np.concatenate((speaker, speaker))
 
+@st.cache_data(show_spinner=False, max_entries=1024)
 def compute_q3_metrics(call: Dict) -> Dict:
     cid = call["call_id"]
-    ts = call["turns"]
-    if not ts:
+    if not len(call["stime"]):
         return {"call_id": cid, "duration_sec": 0, "overtalk_sec": 0, "overtalk_pct": 0.0, "silence_sec": 0, "silence_pct": 0.0}
-    start = min(t["stime"] for t in ts)
-    end = max(t["etime"] for t in ts)
-    dur = max(0, end - start)
-    a_iv = intervals_from_turns(ts, "agent")
-    c_iv = intervals_from_turns(ts, "customer")
-    any_len = union_length(a_iv + c_iv)
-    over_iv = intersect_two_sets(a_iv, c_iv)
-    over_len = sum(e - s for s, e in over_iv)
+    if not HAS_NUMBA and len(call["stime"]) < VECTOR_SWEEP_MIN_TURNS:
+        dur, any_len, over_len = sweep_turns_py(call["stime"].tolist(), call["etime"].tolist(), call["speaker"].tolist())
+    else:
+        a_iv = intervals_from_turns(call, AGENT)
+        c_iv = intervals_from_turns(call, CUSTOMER)
+        if len(a_iv) and len(c_iv):
+            dur, any_len, over_len = sweep_metrics(*events_from_turns(call["stime"], call["etime"], call["speaker"]))
+        else:
+            # single-speaker (or silent) call: nothing can overlap, so skip the sweep
+            dur = int(call["etime"].max() - call["stime"].min())
+            merged = merge_intervals_np(a_iv if len(a_iv) else c_iv)
+            any_len = int((merged[:, 1] - merged[:, 0]).sum())
+            over_len = 0
     silence_len = max(0, dur - any_len)
     over_pct = (over_len / dur) if dur > 0 else 0.0
     silence_pct = (silence_len / dur) if dur > 0 else 0.0
@@ -161,11 +205,11 @@ def compute_q3_metrics(call: Dict) -> Dict:
         "silence_pct": silence_pct,
     }
 
-def make_call_figure(call_id: str, metrics_map: Dict[str, Dict]):
+def make_call_figure(call_id: str, metrics_map: Dict[str, Dict], ax):
     m = metrics_map[call_id]
     labels = ["Overtalk %", "Silence %"]
     vals = [m["overtalk_pct"] * 100.0, m["silence_pct"] * 100.0]
-    fig, ax = plt.subplots(figsize=(6, 4))
+    ax.clear()
     bars = ax.bar(labels, vals)
     ax.set_ylim(0, 100)
     ax.set_ylabel("Percentage (%)")
@@ -180,8 +224,8 @@ def make_call_figure(call_id: str, metrics_map: Dict[str, Dict]):
     )
     ax.text(1.05, 0.5, info, transform=ax.transAxes, va="center",
             bbox=dict(boxstyle="round", alpha=0.1, pad=0.5), fontsize=10)
-    plt.tight_layout()
-    return fig
+    ax.figure.tight_layout()
+    return ax.figure
 
 st.title("Q3: Overtalk and Silence Visualizer")
 
@@ -197,24 +241,38 @@ if "metrics" not in st.session_state:
     st.session_state.metrics = {}
 if "call_ids" not in st.session_state:
     st.session_state.call_ids = []
+if "q3_fig" not in st.session_state:
+    st.session_state.q3_fig, st.session_state.q3_ax = plt.subplots(figsize=(6, 4))
 
 if mode == "Upload ZIP of calls (multiple)":
     st.markdown("Upload a ZIP with JSON or YAML files. The filename without extension is used as call_id.")
     zip_file = st.file_uploader("Upload calls ZIP", type=["zip"])
     if zip_file is not None:
-        with zipfile.ZipFile(io.BytesIO(zip_file.read()), "r") as zf:
-            loaded = {}
+        with zipfile.ZipFile(zip_file, "r") as zf:
+            members = []
             for name in zf.namelist():
                 if name.lower().endswith((".json", ".yaml", ".yml")) and not name.endswith("/"):
                     try:
                         with zf.open(name) as f:
-                            file_bytes = f.read()
-                        c = load_call_from_bytes(name, file_bytes)
-                        loaded[c["call_id"]] = c
+                            members.append((name, f.read()))
                     except Exception as e:
                         st.warning(f"Skipped {name}: {e}")
+        loaded = {}
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as ex:
+            futures = [(name, ex.submit(load_call_from_bytes, name, b)) for name, b in members]
+            for name, fut in futures:
+                try:
+                    c = fut.result()
+                    loaded[c["call_id"]] = c
+                except Exception as e:
+                    st.warning(f"Skipped {name}: {e}")
+            if HAS_NUMBA:
+                # the JIT'd kernels release the GIL, so metrics can overlap across threads
+                metrics = list(ex.map(compute_q3_metrics, loaded.values()))
+            else:
+                metrics = [compute_q3_metrics(c) for c in loaded.values()]
         st.session_state.calls = loaded
-        st.session_state.metrics = {cid: compute_q3_metrics(c) for cid, c in loaded.items()}
+        st.session_state.metrics = {m["call_id"]: m for m in metrics}
         st.session_state.call_ids = sorted(st.session_state.metrics.keys())
 
     if st.session_state.call_ids:
@@ -235,8 +293,8 @@ if mode == "Upload ZIP of calls (multiple)":
         chosen_id = pasted_id.strip() if pasted_id.strip() else selected_id
         if st.button("Generate visualization", key="viz_zip"):
             if chosen_id in st.session_state.metrics:
-                fig = make_call_figure(chosen_id, st.session_state.metrics)
-                st.pyplot(fig)
+                fig = make_call_figure(chosen_id, st.session_state.metrics, st.session_state.q3_ax)
+                st.pyplot(fig, clear_figure=False)
             else:
                 st.error(f"call_id '{chosen_id}' not found. Try selecting from the list above.")
     else:
@@ -261,8 +319,8 @@ else:
                 single_call = load_call_from_prompt(call_id_input.strip() or "PROMPT_1", prompt_text)
                 metrics = compute_q3_metrics(single_call)
                 metrics_map = {metrics["call_id"]: metrics}
-                fig = make_call_figure(metrics["call_id"], metrics_map)
-                st.pyplot(fig)
+                fig = make_call_figure(metrics["call_id"], metrics_map, st.session_state.q3_ax)
+                st.pyplot(fig, clear_figure=False)
             except Exception as e:
                 st.error(f"Failed to parse or visualize the JSON prompt: {e}")
 
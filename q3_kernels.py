@@ -0,0 +1,53 @@
+import numpy as np
+from numba import njit
+
+# Numba versions of the Q3 interval helpers in pages/02_Q3_Visualizer.py.
+# Only int64 ndarrays and scalars cross the boundary; nogil lets the ZIP
+# loader run them from its thread pool.
+
+@njit(cache=True, fastmath=False, nogil=True)
+def merge_intervals_np(arr):
+    n = arr.shape[0]
+    out = np.empty((n, 2), dtype=np.int64)
+    if n == 0:
+        return out
+    order = np.argsort(arr[:, 0], kind="mergesort")
+    s = arr[order[0], 0]
+    e = arr[order[0], 1]
+    k = 0
+    for idx in range(1, n):
+        r = order[idx]
+        if arr[r, 0] > e:
+            out[k, 0] = s
+            out[k, 1] = e
+            k += 1
+            s = arr[r, 0]
+            e = arr[r, 1]
+        elif arr[r, 1] > e:
+            e = arr[r, 1]
+    out[k, 0] = s
+    out[k, 1] = e
+    return out[:k + 1]
+
+@njit(cache=True, fastmath=False, nogil=True)
+def sweep_metrics(times, deltas, speaker):
+    order = np.argsort(times, kind="mergesort")
+    start = times[order[0]]
+    t_prev = start
+    agent_active = 0
+    cust_active = 0
+    any_len = 0
+    over_len = 0
+    for idx in range(order.shape[0]):
+        r = order[idx]
+        dt = times[r] - t_prev
+        if agent_active > 0 or cust_active > 0:
+            any_len += dt
+        if agent_active > 0 and cust_active > 0:
+            over_len += dt
+        if speaker[r] == 0:
+            agent_active += deltas[r]
+        elif speaker[r] == 1:
+            cust_active += deltas[r]
+        t_prev = times[r]
+    return t_prev - start, any_len, over_len
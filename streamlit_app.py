@@ -1,26 +1,48 @@
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import os
+from typing import List, Optional, Tuple
 
 PATTERN_CSV_PATH = "./outputs/regex_summary.csv"
 ML_CSV_PATH = "./outputs/gemini_summary.csv"
+TRUE_STRINGS = ["true", "1", "yes", "y"]
+
+PATTERN_PROFANITY_COLS = ["call_id", "profanity_agent", "profanity_customer"]
+PATTERN_PRIVACY_COLS = ["call_id", "info_shared_without_identity_verification"]
+ML_PROFANITY_COLS = ["call_id", "profane_words_agent", "profane_words_customer",
+                     "agent_profane_words_count", "customer_profane_words_count"]
+ML_PRIVACY_COLS = ["call_id", "disclosed_before_verify"]
 
 def _as_bool_series(series: pd.Series, length: int) -> pd.Series:
     if series is None:
         return pd.Series([False] * length)
     if series.dtype == bool:
         return series.fillna(False)
-    return series.astype(str).str.strip().str.lower().map(
-        {"true": True, "1": True, "yes": True, "y": True,
-         "false": False, "0": False, "no": False, "n": False}
-    ).fillna(False)
-
-def load_csv_from_path(path: str) -> pd.DataFrame:
+    return series.astype("string").str.strip().str.lower().isin(TRUE_STRINGS)
+
+def _flagged_ids(df: pd.DataFrame, flags: pd.Series) -> np.ndarray:
+    ids = df["call_id"]
+    mask = flags.to_numpy(dtype=bool) & ids.notna().to_numpy()
+    return np.unique(ids.to_numpy(dtype=str, na_value="")[mask])
+
+@st.cache_data(show_spinner=False)
+def _read_csv_cached(path: str, mtime: float, size: int, usecols: Optional[Tuple[str, ...]]) -> pd.DataFrame:
+    if usecols is not None:
+        header = pd.read_csv(path, nrows=0).columns
+        usecols = [c for c in usecols if c in header]
+    df = pd.read_csv(path, engine="pyarrow", usecols=usecols)
+    if "call_id" in df.columns:
+        df["call_id"] = df["call_id"].astype("string")
+    return df
+
+def load_csv_from_path(path: str, usecols: Optional[List[str]] = None) -> pd.DataFrame:
     if not path or not os.path.exists(path):
         return pd.DataFrame()
     try:
-        return pd.read_csv(path)
+        return _read_csv_cached(path, os.path.getmtime(path), os.path.getsize(path),
+                                tuple(usecols) if usecols is not None else None)
     except Exception as e:
         st.error(f"Failed to read CSV at {path}: {e}")
         return pd.DataFrame()
@@ -35,8 +57,8 @@ def show_pattern_profanity(df: pd.DataFrame) -> None:
             df[col] = _as_bool_series(df[col], n)
 
     st.subheader("Q1 · Profanity Detection (Pattern Matching)")
-    agents = df.loc[df.get("profanity_agent", pd.Series([False]*n)) == True, "call_id"].unique()
-    customers = df.loc[df.get("profanity_customer", pd.Series([False]*n)) == True, "call_id"].unique()
+    agents = _flagged_ids(df, df.get("profanity_agent", pd.Series([False]*n)))
+    customers = _flagged_ids(df, df.get("profanity_customer", pd.Series([False]*n)))
 
     if len(agents) == 0 and len(customers) == 0:
         st.success("No profanity detected by agents or customers.")
@@ -64,7 +86,7 @@ def show_pattern_privacy(df: pd.DataFrame) -> None:
         df[col] = _as_bool_series(df[col], n)
 
     st.subheader("Q2 · Privacy & Compliance (Pattern Matching)")
-    viol = df.loc[df.get(col, pd.Series([False]*n)) == True, "call_id"].unique()
+    viol = _flagged_ids(df, df.get(col, pd.Series([False]*n)))
     if len(viol) == 0:
         st.success("No cases where sensitive info was shared before verification.")
     else:
@@ -90,8 +112,8 @@ def show_ml_profanity(df: pd.DataFrame) -> None:
         customer_flags = (df.get("customer_profane_words_count", pd.Series([0]*n)).fillna(0).astype(float) > 0)
 
     st.subheader("Q1 · Profanity Detection (ML/LLM)")
-    agents = df.loc[agent_flags == True, "call_id"].astype(str).unique()
-    customers = df.loc[customer_flags == True, "call_id"].astype(str).unique()
+    agents = _flagged_ids(df, agent_flags)
+    customers = _flagged_ids(df, customer_flags)
 
     if len(agents) == 0 and len(customers) == 0:
         st.success("No profanity detected by agents or customers.")
@@ -117,7 +139,7 @@ def show_ml_privacy(df: pd.DataFrame) -> None:
     df["disclosed_before_verify"] = _as_bool_series(df.get("disclosed_before_verify", pd.Series([False]*n)), n)
 
     st.subheader("Q2 · Privacy & Compliance (ML/LLM)")
-    viol = df.loc[df["disclosed_before_verify"] == True, "call_id"].astype(str).unique()
+    viol = _flagged_ids(df, df["disclosed_before_verify"])
     if len(viol) == 0:
         st.success("No cases where sensitive info was shared before verification.")
     else:
@@ -128,20 +150,17 @@ def main() -> None:
     st.set_page_config(page_title="Call Compliance & Quality Analysis", layout="centered")
     st.title("Call Compliance and Quality Analysis")
 
-    pattern_df = load_csv_from_path(PATTERN_CSV_PATH)
-    ml_df = load_csv_from_path(ML_CSV_PATH)
-
     approach = st.selectbox("Select approach", ["Pattern Matching", "ML/LLM"], index=0)
     entity = st.selectbox("Select entity", ["Profanity Detection", "Privacy & Compliance Violation"], index=0)
 
     if approach == "Pattern Matching" and entity == "Profanity Detection":
-        show_pattern_profanity(pattern_df)
+        show_pattern_profanity(load_csv_from_path(PATTERN_CSV_PATH, PATTERN_PROFANITY_COLS))
     elif approach == "Pattern Matching" and entity == "Privacy & Compliance Violation":
-        show_pattern_privacy(pattern_df)
+        show_pattern_privacy(load_csv_from_path(PATTERN_CSV_PATH, PATTERN_PRIVACY_COLS))
     elif approach == "ML/LLM" and entity == "Profanity Detection":
-        show_ml_profanity(ml_df)
+        show_ml_profanity(load_csv_from_path(ML_CSV_PATH, ML_PROFANITY_COLS))
     else:
-        show_ml_privacy(ml_df)
+        show_ml_privacy(load_csv_from_path(ML_CSV_PATH, ML_PRIVACY_COLS))
 
     st.divider()
     st.write("Looking for call quality metrics")
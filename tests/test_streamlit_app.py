@@ -0,0 +1,24 @@
+from pathlib import Path
+
+from streamlit.testing.v1 import AppTest
+
+APP_PATH = str(Path(__file__).resolve().parent.parent / "streamlit_app.py")
+
+def test_ml_profanity_counts_with_blank_cells(tmp_path, monkeypatch):
+    outputs = tmp_path / "outputs"
+    outputs.mkdir()
+    (outputs / "gemini_summary.csv").write_text(
+        "call_id,agent_profane_words_count,customer_profane_words_count,disclosed_before_verify\n"
+        "CALL_1,,0,False\n"
+        "CALL_2,3,0,True\n"
+        "CALL_3,0,,False\n"
+        "CALL_4,,2,False\n"
+    )
+    monkeypatch.chdir(tmp_path)
+    at = AppTest.from_file(APP_PATH, default_timeout=30).run()
+    at.selectbox[0].set_value("ML/LLM").run()
+    assert not at.exception
+    assert not at.error
+    agents, customers = (t.value["call_id"].astype(str).tolist() for t in at.table)
+    assert agents == ["CALL_2"]
+    assert customers == ["CALL_4"]